@@ -0,0 +1,349 @@
+/// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+/**
+@title An auto-compounding vault that stakes KLA in Staking on behalf of all its depositors.
+@author Shack
+@notice Depositors hold vKLA shares; a keeper harvests matured stakes, claims their rewards and restakes everything in one transaction, so no depositor has to claim, approve and stake again.
+@notice Deposits and withdrawals are both queued: deposits get their shares from the next harvest that stakes them, withdrawals are paid by the next harvest or settlement that has enough KLA unlocked.
+@dev Staking only pays a reward once a staked amount is unstaked, and forbids staking an amount that is already staked, so the vault keeps one lot per harvest and restakes under a fresh amount.
+*/
+
+import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
+import "@openzeppelin/contracts/token/ERC20/IERC20.sol";
+import "@openzeppelin/contracts/access/Ownable.sol";
+import "@openzeppelin/contracts/security/ReentrancyGuard.sol";
+import "./Staking.sol";
+
+contract KoalaVault is ERC20, Ownable, ReentrancyGuard {
+    // Virtual shares and one virtual KLA make donating KLA to the vault useless for rounding later deposits down.
+    uint256 private constant VIRTUAL_SHARES = 10**3;
+    struct Lot {
+        uint256 amount;
+        uint256 stakedAt;
+    }
+    Staking public staking;
+    IERC20 public koalaToken;
+    address public keeper;
+    Lot[] public lots;
+    uint256 public stakedPrincipal;
+    uint256 public reservedForWithdrawals;
+    uint256 public queuedShares;
+    uint256 public currentEpoch;
+    mapping(uint256 => uint256) public epochAssets;
+    mapping(uint256 => uint256) public epochShares;
+    mapping(address => uint256) public userQueuedShares;
+    mapping(address => uint256) public userQueuedEpoch;
+    uint256 public pendingDeposits;
+    uint256 public depositEpoch;
+    mapping(uint256 => uint256) public depositEpochAssets;
+    mapping(uint256 => uint256) public depositEpochShares;
+    mapping(address => uint256) public userDepositAmount;
+    mapping(address => uint256) public userDepositEpoch;
+    event Deposited(
+        address indexed investor,
+        uint256 indexed epoch,
+        uint256 amount
+    );
+    event SharesClaimed(address indexed investor, uint256 shares);
+    event WithdrawRequested(
+        address indexed investor,
+        uint256 indexed epoch,
+        uint256 shares
+    );
+    event Withdrawn(address indexed investor, uint256 amount);
+    event WithdrawalsSettled(
+        uint256 indexed epoch,
+        uint256 assets,
+        uint256 shares
+    );
+    event DepositsProcessed(
+        uint256 indexed epoch,
+        uint256 assets,
+        uint256 shares
+    );
+    event Harvested(
+        uint256 reward,
+        uint256 restaked,
+        uint256 unstakedLots
+    );
+
+    modifier onlyKeeper() {
+        require(
+            msg.sender == keeper || msg.sender == owner(),
+            "Only the keeper can harvest"
+        );
+        _;
+    }
+
+    /// @param _staking Staking contract whose reward token is the token compounded by the vault.
+    /// @param _keeper Address allowed to call harvest() besides the owner.
+    constructor(address _staking, address _keeper)
+        ERC20("Koala Vault", "vKLA")
+    {
+        staking = Staking(_staking);
+        koalaToken = staking.rewardToken();
+        keeper = _keeper;
+    }
+
+    /// @param _keeper New address allowed to call harvest().
+    function setKeeper(address _keeper) public onlyOwner {
+        keeper = _keeper;
+    }
+
+    /// @return uint256 KLA owned by the shareholders: idle, staked, the reward staked lots will be paid and rewarded but not yet claimed.
+    /// @dev Staking pays a fixed tokensToRate * amount when a lot is unstaked, so that reward is priced in from the moment the lot is staked; queued deposits are left out until harvest() stakes them and mints their shares.
+    function totalAssets() public view returns (uint256) {
+        uint256 _rate = staking.tokensToRate(address(koalaToken));
+        return
+            idleAssets() +
+            (_rate + 1) *
+            stakedPrincipal +
+            staking.tokenToUserReward(address(koalaToken), address(this));
+    }
+
+    /// @param _assets Amount of KLA.
+    /// @return uint256 vKLA that _assets buys at the current share price.
+    function convertToShares(uint256 _assets) public view returns (uint256) {
+        return
+            (_assets * (totalSupply() + VIRTUAL_SHARES)) / (totalAssets() + 1);
+    }
+
+    /// @param _shares Amount of vKLA.
+    /// @return uint256 KLA that _shares is worth at the current share price.
+    function convertToAssets(uint256 _shares) public view returns (uint256) {
+        return
+            (_shares * (totalAssets() + 1)) / (totalSupply() + VIRTUAL_SHARES);
+    }
+
+    /// @return uint256 KLA held by the vault for the shareholders, neither reserved for processed withdrawals nor queued for deposit.
+    function idleAssets() public view returns (uint256) {
+        return
+            koalaToken.balanceOf(address(this)) -
+            reservedForWithdrawals -
+            pendingDeposits;
+    }
+
+    /// @return uint256 Reward in KLA that harvest() would claim now.
+    /// @dev Used by the keeper script to decide whether a harvest pays for its gas.
+    function harvestableReward() public view returns (uint256) {
+        return
+            staking.tokenToUserReward(address(koalaToken), address(this)) +
+            staking.tokensToRate(address(koalaToken)) *
+            maturedPrincipal();
+    }
+
+    /// @return uint256 KLA that harvest() would have unlocked to settle queued withdrawals with.
+    /// @dev Used by the keeper script to harvest as soon as queued withdrawals can be paid.
+    function unlockableAssets() public view returns (uint256) {
+        return idleAssets() + maturedPrincipal() + harvestableReward();
+    }
+
+    /// @return uint256 KLA that harvest() would stake now: queued deposits and unlocked KLA that queued withdrawals don't need.
+    /// @dev Used by the keeper script to value a harvest.
+    function restakableAssets() public view returns (uint256) {
+        uint256 _unlockable = unlockableAssets();
+        uint256 _needed = convertToAssets(queuedShares);
+        if (_unlockable <= _needed) {
+            return pendingDeposits;
+        }
+        return pendingDeposits + _unlockable - _needed;
+    }
+
+    /// @dev Sums the amounts of the lots that can be unstaked now.
+    function maturedPrincipal() private view returns (uint256) {
+        uint256 _principal;
+        uint256 _lockTime = staking.unstakeTime() * 1 days;
+        for (uint256 i = 0; i < lots.length; i++) {
+            if (block.timestamp >= lots[i].stakedAt + _lockTime) {
+                _principal += lots[i].amount;
+            }
+        }
+        return _principal;
+    }
+
+    /// @param _amount Amount of KLA to deposit.
+    /// @notice Deposited KLA is queued until the next harvest stakes it and mints its shares at the share price after the restake, so the reward it is staked for goes to its depositor only.
+    /// @dev The share check uses the current price and only rejects deposits too small to ever be worth a share.
+    function deposit(uint256 _amount) external nonReentrant {
+        require(_amount > 0, "You should send at least some token!");
+        require(
+            convertToShares(_amount) > 0,
+            "Your deposit is worth less than a share!"
+        );
+        claimShares(msg.sender);
+        koalaToken.transferFrom(msg.sender, address(this), _amount);
+        userDepositAmount[msg.sender] += _amount;
+        userDepositEpoch[msg.sender] = depositEpoch;
+        pendingDeposits += _amount;
+        emit Deposited(msg.sender, depositEpoch, _amount);
+    }
+
+    /// @param _investor Address whose processed deposit is turned into shares.
+    /// @return uint256 vKLA transferred to _investor, 0 if its deposit hasn't been processed yet.
+    /// @notice deposit() and requestWithdraw() call this function themselves.
+    function claimShares(address _investor) public returns (uint256) {
+        uint256 _amount = userDepositAmount[_investor];
+        uint256 _epoch = userDepositEpoch[_investor];
+        if (_amount == 0 || _epoch >= depositEpoch) {
+            return 0;
+        }
+        uint256 _shares = (_amount * depositEpochShares[_epoch]) /
+            depositEpochAssets[_epoch];
+        delete userDepositAmount[_investor];
+        delete userDepositEpoch[_investor];
+        _transfer(address(this), _investor, _shares);
+        emit SharesClaimed(_investor, _shares);
+        return _shares;
+    }
+
+    /// @param _shares Amount of vKLA to redeem.
+    /// @notice Staked KLA is locked, so shares are queued and priced by the next harvest that has enough KLA unlocked; withdraw() pays them out afterwards.
+    function requestWithdraw(uint256 _shares) external nonReentrant {
+        require(_shares > 0, "You should redeem at least some shares!");
+        require(
+            userQueuedShares[msg.sender] == 0 ||
+                userQueuedEpoch[msg.sender] == currentEpoch,
+            "Withdraw your processed request first"
+        );
+        claimShares(msg.sender);
+        _transfer(msg.sender, address(this), _shares);
+        userQueuedShares[msg.sender] += _shares;
+        userQueuedEpoch[msg.sender] = currentEpoch;
+        queuedShares += _shares;
+        emit WithdrawRequested(msg.sender, currentEpoch, _shares);
+    }
+
+    /// @notice This function transfers the KLA of a withdrawal request once a harvest or settleWithdrawals() has processed it.
+    function withdraw() external nonReentrant {
+        uint256 _shares = userQueuedShares[msg.sender];
+        uint256 _epoch = userQueuedEpoch[msg.sender];
+        require(_shares > 0, "There's no withdrawal request!");
+        require(
+            _epoch < currentEpoch,
+            "Your request hasn't been processed yet"
+        );
+        uint256 _amount = (_shares * epochAssets[_epoch]) /
+            epochShares[_epoch];
+        delete userQueuedShares[msg.sender];
+        delete userQueuedEpoch[msg.sender];
+        reservedForWithdrawals -= _amount;
+        koalaToken.transfer(msg.sender, _amount);
+        emit Withdrawn(msg.sender, _amount);
+    }
+
+    /// @notice Unstakes every matured lot, claims the rewards, settles queued withdrawals, restakes the KLA they don't need together with queued deposits as one lot and mints the deposits' shares.
+    /// @dev A failing claimRewards or stakeToken doesn't revert the harvest, so withdrawals are settled whenever the unlocked KLA covers them.
+    function harvest() external onlyKeeper nonReentrant {
+        uint256 _unstakedLots = unstakeMaturedLots();
+        uint256 _reward = claimReward();
+        settleQueuedWithdrawals();
+        uint256 _deposits = pendingDeposits;
+        uint256 _free = idleAssets();
+        uint256 _needed = convertToAssets(queuedShares);
+        _free = _free > _needed ? _free - _needed : 0;
+        uint256 _restaked = restake(_free + _deposits);
+        pendingDeposits = 0;
+        if (_deposits > 0) {
+            mintDepositShares(_deposits, _restaked);
+        }
+        emit Harvested(_reward, _restaked, _unstakedLots);
+    }
+
+    /// @notice Unstakes every matured lot, claims the rewards and settles queued withdrawals without restaking anything.
+    /// @dev Lets the keeper pay queued withdrawals for less gas than a harvest, or while Staking doesn't accept stakes.
+    function settleWithdrawals() external onlyKeeper nonReentrant {
+        unstakeMaturedLots();
+        claimReward();
+        settleQueuedWithdrawals();
+    }
+
+    /// @dev Called by harvest() and settleWithdrawals(); Staking can't pay a reward it doesn't hold, so a failing claim is skipped and retried by the next call.
+    function claimReward() private returns (uint256) {
+        address _token = address(koalaToken);
+        if (staking.tokenToUserReward(_token, address(this)) == 0) {
+            return 0;
+        }
+        uint256 _balance = koalaToken.balanceOf(address(this));
+        try staking.claimRewards(_token) {
+            return koalaToken.balanceOf(address(this)) - _balance;
+        } catch {
+            return 0;
+        }
+    }
+
+    /// @dev Called by harvest() and settleWithdrawals(); prices every queued share at once and only when the idle KLA covers them all.
+    function settleQueuedWithdrawals() private {
+        if (queuedShares == 0) {
+            return;
+        }
+        uint256 _assets = convertToAssets(queuedShares);
+        if (_assets > idleAssets()) {
+            return;
+        }
+        epochAssets[currentEpoch] = _assets;
+        epochShares[currentEpoch] = queuedShares;
+        reservedForWithdrawals += _assets;
+        _burn(address(this), queuedShares);
+        emit WithdrawalsSettled(currentEpoch, _assets, queuedShares);
+        queuedShares = 0;
+        currentEpoch++;
+    }
+
+    /// @dev Called by harvest() once the deposits are restaked; deposits are staked before any other KLA, and what isn't staked is worth its amount only.
+    function mintDepositShares(uint256 _deposits, uint256 _restaked) private {
+        uint256 _staked = _restaked < _deposits ? _restaked : _deposits;
+        uint256 _rate = staking.tokensToRate(address(koalaToken));
+        uint256 _value = (_rate + 1) * _staked + _deposits - _staked;
+        // totalAssets() already holds the deposits, they are priced against everything else.
+        uint256 _shares = (_value * (totalSupply() + VIRTUAL_SHARES)) /
+            (totalAssets() - _value + 1);
+        depositEpochAssets[depositEpoch] = _deposits;
+        depositEpochShares[depositEpoch] = _shares;
+        _mint(address(this), _shares);
+        emit DepositsProcessed(depositEpoch, _deposits, _shares);
+        depositEpoch++;
+    }
+
+    /// @dev Called by harvest() and settleWithdrawals(); removes lots by swapping in the last one, so lots isn't kept in staking order.
+    function unstakeMaturedLots() private returns (uint256) {
+        uint256 _unstaked;
+        uint256 _lockTime = staking.unstakeTime() * 1 days;
+        uint256 i = 0;
+        while (i < lots.length) {
+            Lot memory _lot = lots[i];
+            if (block.timestamp >= _lot.stakedAt + _lockTime) {
+                staking.unstakeToken(address(koalaToken), _lot.amount);
+                stakedPrincipal -= _lot.amount;
+                lots[i] = lots[lots.length - 1];
+                lots.pop();
+                _unstaked++;
+            } else {
+                i++;
+            }
+        }
+        return _unstaked;
+    }
+
+    /// @dev Called by harvest(); the amount is lowered by a few wei until Staking accepts it as not duplicated, the remainder stays idle until the next harvest. Returns 0 if Staking refuses the stake.
+    function restake(uint256 _amount) private returns (uint256) {
+        while (
+            _amount > 0 &&
+            staking.tokenAmountToStakingTime(address(this), _amount) != 0
+        ) {
+            _amount--;
+        }
+        if (_amount == 0) {
+            return 0;
+        }
+        koalaToken.approve(address(staking), _amount);
+        try staking.stakeToken(address(koalaToken), _amount) {
+            lots.push(Lot(_amount, block.timestamp));
+            stakedPrincipal += _amount;
+            return _amount;
+        } catch {
+            koalaToken.approve(address(staking), 0);
+            return 0;
+        }
+    }
+}
@@ -0,0 +1,69 @@
+from scripts.staking_analytics import (
+    SECONDS_PER_DAY,
+    StakingHistory,
+    outstanding_reward_liability,
+    maturity_schedule,
+    tvl_usd,
+)
+import time
+import numpy as np
+
+POSITIONS = 1000000
+INVESTORS = 100000
+TOKENS = 4
+DISTINCT_AMOUNTS = 50000
+UNSTAKED_SHARE = 0.3
+CLAIMED_SHARE = 0.5
+UNSTAKE_TIME = 30
+
+
+def synthetic_history(positions=POSITIONS, seed=0):
+    """Builds a StakingHistory of 'positions' stakes spread over a year, a share of
+    them unstaked and a share of those rewards claimed."""
+    rng = np.random.default_rng(seed)
+    amounts = np.arange(1, DISTINCT_AMOUNTS + 1, dtype=object) * 10**17
+    stake_investor = rng.integers(0, INVESTORS, positions)
+    stake_token = rng.integers(0, TOKENS, positions)
+    stake_amount_key = rng.integers(0, DISTINCT_AMOUNTS, positions)
+    stake_time = np.sort(rng.integers(0, 365 * SECONDS_PER_DAY, positions))
+    unstaked = np.sort(
+        rng.choice(positions, int(positions * UNSTAKED_SHARE), replace=False)
+    )
+    claimed = unstaked[rng.random(len(unstaked)) < CLAIMED_SHARE]
+    return StakingHistory(
+        investors=range(INVESTORS),
+        tokens=range(TOKENS),
+        amounts=amounts,
+        stake_investor=stake_investor,
+        stake_token=stake_token,
+        stake_amount_key=stake_amount_key,
+        stake_time=stake_time,
+        # Stakes come first in the chain, then unstakes in the order they happened.
+        stake_order=np.arange(positions),
+        unstake_investor=stake_investor[unstaked],
+        unstake_token=stake_token[unstaked],
+        unstake_amount_key=stake_amount_key[unstaked],
+        unstake_order=positions + np.arange(len(unstaked)),
+        claim_investor=stake_investor[claimed],
+        claim_token=stake_token[claimed],
+        claim_amount=amounts[stake_amount_key[claimed]],
+    )
+
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<32}{(time.perf_counter() - start) * 1000:>10.1f} ms")
+    return result
+
+
+def main(positions=POSITIONS):
+    rates = np.arange(1, TOKENS + 1)
+    prices = np.full(TOKENS, 2000e18)
+    decimals = np.full(TOKENS, 18)
+    history = timed("build synthetic history", synthetic_history, positions)
+    print(f"{positions} positions, {len(history.unstake_token)} unstaked")
+    timed("match open positions", history.open_positions)
+    timed("outstanding reward liability", outstanding_reward_liability, history, rates)
+    timed("maturity schedule", maturity_schedule, history, rates, UNSTAKE_TIME)
+    timed("TVL in USD", tvl_usd, history, prices, decimals)
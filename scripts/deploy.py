@@ -1,5 +1,5 @@
-from brownie import KoalaToken, Staking, network
-from scripts.helpful_scripts import get_contract, get_account
+from brownie import KoalaToken, KoalaVault, Staking, network
+from scripts.helpful_scripts import get_contract, get_account, use_pooled_transport
 from web3 import Web3
 
 REMAINED_KLA_AMOUNT = Web3.toWei(1000, "ether")
@@ -41,5 +41,22 @@ def set_tokens_data(staking, TOKENS_PRICE_FEED_ADDRESSES, TOKENS_RATE, account):
     return staking
 
 
+def deploy_KoalaVault(staking, keeper=None):
+    account = get_account()
+    vault = KoalaVault.deploy(
+        staking.address, keeper or account, {"from": account}, publish_source=True
+    )
+    return vault
+
+
 def main():
-    deploy_KoalaToken_and_Staking()
+    transport = use_pooled_transport()
+    staking, koala_Token = deploy_KoalaToken_and_Staking()
+    deploy_KoalaVault(staking)
+    if transport:
+        stats = transport.stats()
+        print(
+            f"RPC: {stats['requests']} requests in {stats['http_posts']} posts, "
+            f"cache hit rate {stats['hit_rate']:.0%}, "
+            f"mean latency {stats['mean_latency'] * 1000:.1f} ms"
+        )
@@ -8,7 +8,10 @@ from brownie import (
     MockBAT,
     MockLINK,
     MockETH,
+    web3,
 )
+from scripts.rpc_transport import PooledBatchProvider
+from web3 import HTTPProvider
 import dotenv
 
 LOCAL_BLOCKCHAIN_ENVIRONMENTS = ["ganache", "hardhat", "development"]
@@ -36,6 +39,26 @@ def get_account(id=None, index=None):
     return accounts.add(config["wallets"]["from_key"])
 
 
+def use_pooled_transport():
+    """Swaps the web3 provider of a live network for a PooledBatchProvider, so script
+    calls and receipt polls share keep-alive connections, are sent as JSON-RPC
+    batches and immutable responses are served from cache.
+    Local networks keep their provider, as chain.revert() would stale the cache.
+        Returns:
+            PooledBatchProvider: The active provider, or None on a local network.
+    """
+    if network.show_active() in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        return None
+    if isinstance(web3.provider, PooledBatchProvider):
+        return web3.provider
+    if isinstance(web3.provider, HTTPProvider):
+        web3.provider = PooledBatchProvider(
+            web3.provider.endpoint_uri, web3.provider._request_kwargs
+        )
+        return web3.provider
+    return None
+
+
 def get_contract(contract_name):
     """If you want to use this function, go to the brownie config and add a new entry for
     the contract that you want to be able to 'get'. Then add an entry in the in the variable 'contract_to_mock'.
@@ -0,0 +1,83 @@
+from brownie import Contract, KoalaVault, MockV3Aggregator, Staking, web3
+from scripts.helpful_scripts import get_account, get_contract
+
+# A harvest has to bring in this many times its gas cost to be sent.
+PROFIT_MARGIN = 2
+
+
+def get_price(price_feed):
+    return price_feed.latestRoundData()[1], price_feed.decimals()
+
+
+def harvest_value(vault, staking):
+    """Returns the KLA a harvest brings in now: the reward that queued deposits and
+    unlocked KLA start earning once they are restaked. Rewards claimed from matured
+    lots are already counted in the share price."""
+    rate = staking.tokensToRate(vault.koalaToken())
+    return rate * vault.restakableAssets()
+
+
+def harvest_is_profitable(vault, staking, keeper):
+    """Compares the USD value a harvest brings in with the USD cost of its gas.
+    Returns:
+        (bool, int, int): Whether to harvest, the value and the gas cost in USD wei.
+    """
+    value = harvest_value(vault, staking)
+    if value == 0:
+        return False, 0, 0
+    kla_usd_price_feed = Contract.from_abi(
+        "AggregatorV3Interface",
+        staking.tokensToPriceFeed(vault.koalaToken()),
+        MockV3Aggregator.abi,
+    )
+    kla_price, kla_decimals = get_price(kla_usd_price_feed)
+    eth_price, eth_decimals = get_price(get_contract("eth_usd_price_feed"))
+    gas = vault.harvest.estimate_gas({"from": keeper})
+    value_usd = value * kla_price // 10**kla_decimals
+    gas_cost_usd = gas * web3.eth.gas_price * eth_price // 10**eth_decimals
+    return value_usd >= gas_cost_usd * PROFIT_MARGIN, value_usd, gas_cost_usd
+
+
+def withdrawals_are_payable(vault):
+    """Queued withdrawals can be settled as soon as the KLA a harvest would unlock
+    covers them; waiting for a profitable harvest would keep them for a whole lock."""
+    queued_shares = vault.queuedShares()
+    return (
+        queued_shares > 0
+        and vault.convertToAssets(queued_shares) <= vault.unlockableAssets()
+    )
+
+
+def next_action(vault, staking, keeper):
+    """Returns the vault function the keeper should call now, or None: harvest()
+    once it pays for its gas, else settleWithdrawals() if queued withdrawals can be
+    paid, which restakes nothing and costs less gas."""
+    profitable, value_usd, gas_cost_usd = harvest_is_profitable(vault, staking, keeper)
+    print(
+        f"Harvest brings {value_usd / 1e18:,.2f} USD "
+        f"for {gas_cost_usd / 1e18:,.2f} USD of gas"
+    )
+    if profitable:
+        return "harvest"
+    if withdrawals_are_payable(vault):
+        print("Queued withdrawals can be paid now")
+        return "settleWithdrawals"
+    return None
+
+
+def harvest(vault=None, staking=None):
+    vault = vault or KoalaVault[-1]
+    staking = staking or Staking.at(vault.staking())
+    keeper = get_account()
+    action = next_action(vault, staking, keeper)
+    if action is None:
+        print("Not profitable yet, skipping harvest")
+        return None
+    tx = getattr(vault, action)({"from": keeper})
+    tx.wait(1)
+    print(f"Called {action}!")
+    return tx
+
+
+def main():
+    harvest()
@@ -0,0 +1,278 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from web3 import HTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde
+import itertools
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+CACHE_SIZE = 4096
+MAX_BATCH_SIZE = 100
+POOL_SIZE = 8
+# Responses tied to a block are cached only once it is this many blocks deep.
+CONFIRMATIONS = 12
+# Least seconds between two eth_blockNumber requests made to check finality.
+HEAD_REFRESH = 1.0
+# decimals() of ERC20 tokens and Chainlink price feeds never changes once deployed.
+IMMUTABLE_CALL_SELECTORS = {"0x313ce567"}
+BLOCK_TAGS = {"latest", "pending", "earliest", "safe", "finalized"}
+# Returned by response_block() for requests made at a block tag such as "latest".
+BLOCK_TAG = "tag"
+
+
+class PooledBatchProvider(HTTPProvider):
+    """HTTPProvider that keeps its connections alive in a pool, sends requests made
+    while every connection is busy as one JSON-RPC batch and caches responses that
+    can't change anymore.
+    A request is posted right away when a connection is free, so sequential scripts
+    never wait for a batch to fill up.
+        Args:
+            endpoint_uri (string): The RPC endpoint, as given to HTTPProvider.
+            cache_size (int): Number of immutable responses kept in the LRU cache.
+            max_batch_size (int): Most requests sent in one batch payload.
+            pool_size (int): Number of HTTP posts in flight and keep-alive connections.
+            confirmations (int): Depth a block needs before responses on it are cached.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri=None,
+        request_kwargs=None,
+        cache_size=CACHE_SIZE,
+        max_batch_size=MAX_BATCH_SIZE,
+        pool_size=POOL_SIZE,
+        confirmations=CONFIRMATIONS,
+    ):
+        super().__init__(endpoint_uri, request_kwargs)
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.pool_size = pool_size
+        self.confirmations = confirmations
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="rpc-transport"
+        )
+        self._ids = itertools.count()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._in_flight = 0
+        self._final_block = -1
+        self._head_checked = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {
+                "requests": 0,
+                "cache_hits": 0,
+                "cache_misses": 0,
+                "http_posts": 0,
+                "batched_requests": 0,
+                "latency": 0.0,
+            }
+
+    def stats(self):
+        """Returns the request counters, the cache hit rate and the mean round trip
+        of an HTTP post in seconds. 'batched_requests' counts the requests sent in
+        batches of more than one."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["cache_hits"] + stats["cache_misses"]
+        stats["hit_rate"] = stats["cache_hits"] / lookups if lookups else 0.0
+        stats["mean_latency"] = (
+            stats["latency"] / stats["http_posts"] if stats["http_posts"] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """Stops the worker threads and closes the pooled connections."""
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    def make_request(self, method, params):
+        key = cache_key(method, params)
+        with self._lock:
+            self._stats["requests"] += 1
+            if key is not None:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self._stats["cache_hits"] += 1
+                    return self._cache[key]
+                self._stats["cache_misses"] += 1
+        future = Future()
+        with self._lock:
+            self._waiting.append((method, params, future))
+            self._post_waiting()
+        response = future.result()
+        if method == "eth_blockNumber" and response.get("result"):
+            self._observe_head(to_int(response["result"]))
+        if key is not None and self._is_settled(method, params, response):
+            with self._lock:
+                self._cache[key] = response
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return response
+
+    def _post_waiting(self):
+        # Called with self._lock held; hands waiting requests to a free connection.
+        if not self._waiting or self._in_flight >= self.pool_size:
+            return
+        batch = self._waiting[: self.max_batch_size]
+        del self._waiting[: self.max_batch_size]
+        self._in_flight += 1
+        self._executor.submit(self._post, batch)
+
+    def _post(self, batch):
+        try:
+            self._send(batch)
+        except Exception as error:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._post_waiting()
+
+    def _send(self, batch):
+        requests_by_id = {}
+        payload = []
+        for method, params, future in batch:
+            request_id = next(self._ids)
+            requests_by_id[request_id] = future
+            payload.append(
+                {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+            )
+        # A batch of one is sent as a plain request for nodes without batch support.
+        body = FriendlyJsonSerde().json_encode(
+            payload if len(payload) > 1 else payload[0]
+        )
+        start = time.perf_counter()
+        raw_response = self._session.post(
+            self.endpoint_uri, data=body, **self.get_request_kwargs()
+        )
+        raw_response.raise_for_status()
+        latency = time.perf_counter() - start
+        responses = self.decode_rpc_response(raw_response.content)
+        with self._lock:
+            self._stats["http_posts"] += 1
+            if len(payload) > 1:
+                self._stats["batched_requests"] += len(payload)
+            self._stats["latency"] += latency
+        if isinstance(responses, dict) and responses.get("id") not in requests_by_id:
+            # The node rejected the batch as a whole.
+            responses = [
+                dict(responses, id=request_id) for request_id in requests_by_id
+            ]
+        elif isinstance(responses, dict):
+            responses = [responses]
+        for response in responses:
+            future = requests_by_id.pop(response.get("id"), None)
+            if future is not None:
+                future.set_result(response)
+        for request_id, future in requests_by_id.items():
+            future.set_exception(
+                ValueError(f"No response for JSON-RPC request {request_id}")
+            )
+
+    def _observe_head(self, head):
+        with self._lock:
+            self._final_block = max(self._final_block, head - self.confirmations)
+            self._head_checked = time.monotonic()
+
+    def _refresh_head(self):
+        # Asks for the head at most once per HEAD_REFRESH seconds.
+        if time.monotonic() - self._head_checked >= HEAD_REFRESH:
+            self.make_request("eth_blockNumber", [])
+        return self._final_block
+
+    def _is_settled(self, method, params, response):
+        """A response is cached once it can't change: it is successful, what it
+        describes exists, and the block it depends on is 'confirmations' deep."""
+        if not is_immutable(method, response):
+            return False
+        block = response_block(method, params, response["result"])
+        if block is None:
+            return True
+        if block == BLOCK_TAG:
+            return self._holds_at_final_block(method, params, response)
+        return block <= self._final_block or block <= self._refresh_head()
+
+    def _holds_at_final_block(self, method, params, response):
+        """A response to a request at a block tag is only cached if the same request
+        at the last block 'confirmations' deep gives the same result, so code or
+        decimals seen in a block that may still be reorged out aren't kept."""
+        final_block = self._refresh_head()
+        if final_block < 0:
+            return False
+        pinned = [params[0], hex(final_block)] + list(params[2:])
+        return self.make_request(method, pinned).get("result") == response["result"]
+
+
+def to_int(value):
+    return value if isinstance(value, int) else int(value, 16)
+
+
+def is_block_number(block):
+    return isinstance(block, int) or (
+        isinstance(block, str) and block not in BLOCK_TAGS
+    )
+
+
+def cache_key(method, params):
+    """Returns a hashable key for requests whose response may be immutable, else None.
+    The key holds every parameter, so eth_call keeps 'from', 'value' and 'gas' apart
+    and eth_getCode keeps its block apart."""
+    params = list(params)
+    cacheable = method in (
+        "eth_chainId",
+        "net_version",
+        "eth_getTransactionReceipt",
+        "eth_getTransactionByHash",
+        "eth_getBlockByHash",
+        "eth_getCode",
+    )
+    if method == "eth_getBlockByNumber":
+        cacheable = is_block_number(params[0])
+    if method == "eth_call":
+        transaction = params[0]
+        block = params[1] if len(params) > 1 else "latest"
+        data = transaction.get("data") or transaction.get("input") or ""
+        cacheable = is_block_number(block) or data[:10] in IMMUTABLE_CALL_SELECTORS
+    if not cacheable:
+        return None
+    return (method, json.dumps(params, sort_keys=True))
+
+
+def is_immutable(method, response):
+    """Only successful responses describing something that exists are cached:
+    mined receipts and transactions, existing blocks, deployed code and calls that
+    returned data."""
+    if "error" in response or response.get("result") is None:
+        return False
+    result = response["result"]
+    if method == "eth_getTransactionByHash":
+        return result.get("blockNumber") is not None
+    if method in ("eth_getCode", "eth_call"):
+        return result not in ("0x", "")
+    return True
+
+
+def response_block(method, params, result):
+    """Returns the number of the block a response depends on, BLOCK_TAG if it was
+    requested at a block tag, or None if it doesn't depend on a block."""
+    if method in ("eth_getTransactionReceipt", "eth_getTransactionByHash"):
+        return to_int(result["blockNumber"])
+    if method in ("eth_getBlockByHash", "eth_getBlockByNumber"):
+        return to_int(result["number"])
+    if method in ("eth_call", "eth_getCode"):
+        block = params[1] if len(params) > 1 else "latest"
+        return to_int(block) if is_block_number(block) else BLOCK_TAG
+    return None
@@ -0,0 +1,341 @@
+from brownie import Contract, Staking, MockV3Aggregator, web3
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+# Blocks per eth_getLogs request; hosted RPCs reject wider ranges.
+LOG_PAGE_SIZE = 2000
+# Log indexes within a block stay below this, so block * LOG_INDEX_SPAN + index
+# orders events as the chain did.
+LOG_INDEX_SPAN = 2**20
+
+
+class StakingHistory:
+    """Columnar view of the Staked/Unstaked/Claimed history of a Staking contract.
+    Investors, tokens and staked amounts are stored as integer codes into the
+    'investors', 'tokens' and 'amounts' lookups so every analytic below is a
+    handful of NumPy operations instead of a loop over positions.
+    Amounts are uint256 and don't fit int64, so reward sums are done in Python ints
+    per distinct (group, amount) pair and are exact to the wei; only the USD TVL is
+    a float.
+        Args:
+            investors (list): Investor addresses, indexed by the *_investor codes.
+            tokens (list): Token addresses, indexed by the *_token codes.
+            amounts (list): Distinct staked amounts in wei, indexed by the
+                *_amount_key codes.
+            stake_investor, stake_token, stake_amount_key (np.ndarray): Codes of
+                every Staked event.
+            stake_time (np.ndarray): Block timestamp of every Staked event.
+            stake_order (np.ndarray): Chain position of every Staked event, see
+                LOG_INDEX_SPAN.
+            unstake_investor, unstake_token, unstake_amount_key (np.ndarray): Codes
+                of every Unstaked event.
+            unstake_order (np.ndarray): Chain position of every Unstaked event.
+            claim_investor, claim_token (np.ndarray): Codes of every Claimed event.
+            claim_amount (list): Claimed reward of every Claimed event in wei.
+    """
+
+    def __init__(
+        self,
+        investors,
+        tokens,
+        amounts,
+        stake_investor,
+        stake_token,
+        stake_amount_key,
+        stake_time,
+        stake_order,
+        unstake_investor,
+        unstake_token,
+        unstake_amount_key,
+        unstake_order,
+        claim_investor,
+        claim_token,
+        claim_amount,
+    ):
+        self.investors = list(investors)
+        self.tokens = list(tokens)
+        self.amount_values = _to_ints(amounts)
+        self.amounts = self.amount_values.astype(np.float64)
+        self.stake_investor = np.asarray(stake_investor, dtype=np.int64)
+        self.stake_token = np.asarray(stake_token, dtype=np.int64)
+        self.stake_amount_key = np.asarray(stake_amount_key, dtype=np.int64)
+        self.stake_time = np.asarray(stake_time, dtype=np.int64)
+        self.stake_order = np.asarray(stake_order, dtype=np.int64)
+        self.unstake_investor = np.asarray(unstake_investor, dtype=np.int64)
+        self.unstake_token = np.asarray(unstake_token, dtype=np.int64)
+        self.unstake_amount_key = np.asarray(unstake_amount_key, dtype=np.int64)
+        self.unstake_order = np.asarray(unstake_order, dtype=np.int64)
+        self.claim_investor = np.asarray(claim_investor, dtype=np.int64)
+        self.claim_token = np.asarray(claim_token, dtype=np.int64)
+        self.claim_amount = _to_ints(claim_amount)
+        self._open = None
+
+    @classmethod
+    def from_events(cls, staked, unstaked, claimed):
+        """Build a history from decoded event tuples.
+        Args:
+            staked (list): (investor, token, amount, timestamp, order) for every
+                Staked event.
+            unstaked (list): (investor, token, amount, order) for every Unstaked event.
+            claimed (list): (investor, token, amount) for every Claimed event.
+        """
+        investors = [e[0] for e in staked] + [e[0] for e in unstaked]
+        investors += [e[0] for e in claimed]
+        tokens = [e[1] for e in staked] + [e[1] for e in unstaked]
+        tokens += [e[1] for e in claimed]
+        investor_lookup, investor_codes = _encode(investors)
+        token_lookup, token_codes = _encode(tokens)
+        # Amounts are keyed through an object array, as uint256 doesn't fit int64.
+        amount_lookup, amount_codes = _encode(
+            [e[2] for e in staked] + [e[2] for e in unstaked]
+        )
+        n_staked, n_unstaked = len(staked), len(unstaked)
+        n_moves = n_staked + n_unstaked
+        return cls(
+            investors=investor_lookup,
+            tokens=token_lookup,
+            amounts=amount_lookup,
+            stake_investor=investor_codes[:n_staked],
+            stake_token=token_codes[:n_staked],
+            stake_amount_key=amount_codes[:n_staked],
+            stake_time=[e[3] for e in staked],
+            stake_order=[e[4] for e in staked],
+            unstake_investor=investor_codes[n_staked:n_moves],
+            unstake_token=token_codes[n_staked:n_moves],
+            unstake_amount_key=amount_codes[n_staked:],
+            unstake_order=[e[3] for e in unstaked],
+            claim_investor=investor_codes[n_moves:],
+            claim_token=token_codes[n_moves:],
+            claim_amount=[e[2] for e in claimed],
+        )
+
+    def _position_key(self, investor, token, amount_key):
+        n_amounts = len(self.amount_values)
+        return (investor * len(self.tokens) + token) * n_amounts + amount_key
+
+    def open_positions(self):
+        """Returns a boolean mask over Staked events that haven't been unstaked yet.
+        Staking can't stake an amount that is still staked, so a stake is open when
+        it is the last Staked event of its (investor, token, amount) and no Unstaked
+        event of it came later in the chain. Staking deletes the staking time on
+        unstake without lowering the balance, so one stake can be followed by
+        several Unstaked events; each of them accrues a reward again.
+        """
+        if self._open is not None:
+            return self._open
+        stake_key = self._position_key(
+            self.stake_investor, self.stake_token, self.stake_amount_key
+        )
+        unstake_key = self._position_key(
+            self.unstake_investor, self.unstake_token, self.unstake_amount_key
+        )
+        # Only the last stake of each position can still be open.
+        order = np.lexsort((self.stake_order, stake_key))
+        sorted_key = stake_key[order]
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = sorted_key[:-1] != sorted_key[1:]
+        latest_stake = np.zeros(len(order), dtype=bool)
+        latest_stake[order] = is_last
+        # Chain position of the last unstake of each position.
+        unstake_sort = np.lexsort((self.unstake_order, unstake_key))
+        sorted_unstake_key = unstake_key[unstake_sort]
+        last_unstake = np.ones(len(unstake_sort), dtype=bool)
+        last_unstake[:-1] = sorted_unstake_key[:-1] != sorted_unstake_key[1:]
+        closed_key = sorted_unstake_key[last_unstake]
+        closed_order = self.unstake_order[unstake_sort][last_unstake]
+        closed_after = np.zeros(len(stake_key), dtype=bool)
+        if len(closed_key):
+            index = np.searchsorted(closed_key, stake_key)
+            index = np.minimum(index, len(closed_key) - 1)
+            matched = closed_key[index] == stake_key
+            closed_after[matched] = (
+                closed_order[index[matched]] > self.stake_order[matched]
+            )
+        self._open = latest_stake & ~closed_after
+        return self._open
+
+    def open_amounts(self):
+        """Returns (token codes, amount codes, stake timestamps) of every open
+        position."""
+        mask = self.open_positions()
+        return (
+            self.stake_token[mask],
+            self.stake_amount_key[mask],
+            self.stake_time[mask],
+        )
+
+
+def _to_ints(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = [int(value) for value in values]
+    return array
+
+
+def _encode(values):
+    lookup, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return list(lookup), codes.astype(np.int64)
+
+
+def _group_sum(values, group, n_groups):
+    """Sums an object array of Python ints per group, exactly."""
+    sums = np.zeros(n_groups, dtype=object)
+    if len(group):
+        order = np.argsort(group, kind="stable")
+        sorted_group = group[order]
+        starts = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+        sums[sorted_group[starts]] = np.add.reduceat(values[order], starts)
+    return sums
+
+
+def _amount_sum(history, group, amount_key, n_groups):
+    """Exact sum in wei of the amounts behind 'amount_key', per group. Events are
+    counted per distinct (group, amount) pair first, so only those pairs are
+    multiplied as Python ints."""
+    n_amounts = len(history.amount_values)
+    pair, count = np.unique(group * n_amounts + amount_key, return_counts=True)
+    values = count.astype(object) * history.amount_values[pair % n_amounts]
+    return _group_sum(values, pair // n_amounts, n_groups)
+
+
+def outstanding_reward_liability(history, rates):
+    """Reward the contract still owes, per token, as tokensToRate * amount.
+    Open positions are owed their reward on unstake; unstaked positions accrue a
+    reward that is owed until it is claimed.
+        Args:
+            history (StakingHistory): Indexed staking history.
+            rates (array-like): tokensToRate of every token in history.tokens.
+        Returns:
+            (np.ndarray, np.ndarray): Pending reward of open positions and unclaimed
+            reward of closed positions, both exact ints in wei and indexed like
+            history.tokens.
+    """
+    rates = _to_ints(rates)
+    n_tokens = len(history.tokens)
+    token, amount_key, _ = history.open_amounts()
+    pending = rates * _amount_sum(history, token, amount_key, n_tokens)
+    accrued = rates * _amount_sum(
+        history, history.unstake_token, history.unstake_amount_key, n_tokens
+    )
+    claimed = _group_sum(history.claim_amount, history.claim_token, n_tokens)
+    return pending, np.where(accrued > claimed, accrued - claimed, 0)
+
+
+def maturity_schedule(history, rates, unstake_time, bucket=SECONDS_PER_DAY):
+    """Groups open positions by the time they can be unstaked.
+    Args:
+        history (StakingHistory): Indexed staking history.
+        rates (array-like): tokensToRate of every token in history.tokens.
+        unstake_time (int): Staking.unstakeTime(), in days.
+        bucket (int): Width of a schedule bucket in seconds.
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): Bucket start timestamps, number of
+        positions maturing in each bucket and the reward they unlock, as exact
+        ints in wei.
+    """
+    rates = _to_ints(rates)
+    n_tokens = len(history.tokens)
+    token, amount_key, stake_time = history.open_amounts()
+    maturity = stake_time + unstake_time * SECONDS_PER_DAY
+    starts, bucket_index = np.unique(maturity // bucket, return_inverse=True)
+    counts = np.bincount(bucket_index, minlength=len(starts))
+    locked = _amount_sum(
+        history, bucket_index * n_tokens + token, amount_key, len(starts) * n_tokens
+    )
+    reward = (locked.reshape(len(starts), n_tokens) * rates).sum(axis=1)
+    return starts * bucket, counts, reward
+
+
+def tvl_usd(history, prices, decimals):
+    """Total value locked per token, computed like Staking.getUserBalanceValue().
+    Args:
+        history (StakingHistory): Indexed staking history.
+        prices (array-like): latestRoundData() answer of every token's price feed.
+        decimals (array-like): decimals() of every token's price feed.
+    Returns:
+        np.ndarray: Staked value of every token in history.tokens, in USD wei as
+        float64.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    scale = np.power(10.0, np.asarray(decimals, dtype=np.float64))
+    token, amount_key, _ = history.open_amounts()
+    locked = np.bincount(
+        token, weights=history.amounts[amount_key], minlength=len(history.tokens)
+    )
+    return locked * prices / scale
+
+
+def get_logs(event, from_block, to_block, page_size=LOG_PAGE_SIZE):
+    """Fetches the logs of 'event' between two blocks, 'page_size' blocks at a time."""
+    logs = []
+    for start in range(from_block, to_block + 1, page_size):
+        end = min(start + page_size - 1, to_block)
+        logs.extend(event.getLogs(fromBlock=start, toBlock=end))
+    return logs
+
+
+def load_staking_history(staking, from_block=0, to_block=None, page_size=LOG_PAGE_SIZE):
+    """Fetches the Staked/Unstaked/Claimed logs of a deployed Staking contract.
+    Logs are requested in pages of 'page_size' blocks, and block timestamps once per
+    block rather than once per event.
+    """
+    if to_block is None:
+        to_block = web3.eth.block_number
+    contract = web3.eth.contract(address=staking.address, abi=staking.abi)
+    logs = {
+        name: get_logs(getattr(contract.events, name), from_block, to_block, page_size)
+        for name in ("Staked", "Unstaked", "Claimed")
+    }
+    timestamps = {
+        block: web3.eth.get_block(block).timestamp
+        for block in {log.blockNumber for log in logs["Staked"]}
+    }
+
+    def decode(log):
+        return (log.args.investor, log.args.token, log.args.amount)
+
+    def order(log):
+        return log.blockNumber * LOG_INDEX_SPAN + log.logIndex
+
+    return StakingHistory.from_events(
+        staked=[
+            decode(log) + (timestamps[log.blockNumber], order(log))
+            for log in logs["Staked"]
+        ],
+        unstaked=[decode(log) + (order(log),) for log in logs["Unstaked"]],
+        claimed=[decode(log) for log in logs["Claimed"]],
+    )
+
+
+def get_tokens_market_data(staking, tokens):
+    """Reads the rate and price feed data of every token once.
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): tokensToRate, latest price and feed
+        decimals.
+    """
+    rates, prices, decimals = [], [], []
+    for token in tokens:
+        rates.append(staking.tokensToRate(token))
+        price_feed = Contract.from_abi(
+            "AggregatorV3Interface",
+            staking.tokensToPriceFeed(token),
+            MockV3Aggregator.abi,
+        )
+        prices.append(price_feed.latestRoundData()[1])
+        decimals.append(price_feed.decimals())
+    return np.array(rates), np.array(prices, dtype=np.float64), np.array(decimals)
+
+
+def main():
+    staking = Staking[-1]
+    history = load_staking_history(staking)
+    rates, prices, decimals = get_tokens_market_data(staking, history.tokens)
+    pending, unclaimed = outstanding_reward_liability(history, rates)
+    tvl = tvl_usd(history, prices, decimals)
+    for index, token in enumerate(history.tokens):
+        print(f"{token}: TVL {tvl[index] / 1e18:,.2f} USD")
+        print(f"    pending rewards   {pending[index] / 10**18:,.4f} KLA")
+        print(f"    unclaimed rewards {unclaimed[index] / 10**18:,.4f} KLA")
+    starts, counts, reward = maturity_schedule(history, rates, staking.unstakeTime())
+    print("Maturity schedule:")
+    for start, count, amount in zip(starts, counts, reward):
+        print(f"    {start}: {count} positions, {amount / 10**18:,.4f} KLA")
@@ -0,0 +1,78 @@
+from brownie import network, chain
+from scripts.helpful_scripts import (
+    LOCAL_BLOCKCHAIN_ENVIRONMENTS,
+    get_account,
+)
+from scripts.deploy import (
+    deploy_KoalaToken_and_Staking,
+    deploy_KoalaVault,
+)
+from scripts.keeper import (
+    harvest_is_profitable,
+    next_action,
+    withdrawals_are_payable,
+)
+import pytest
+from web3 import Web3
+
+
+def deposit(vault, koala_Token, account, amount):
+    koala_Token.transfer(account, amount, {"from": get_account(index=0)})
+    koala_Token.approve(vault, amount, {"from": account})
+    vault.deposit(amount, {"from": account})
+
+
+def test_harvest_isnt_profitable_without_rewards():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    # Act
+    profitable, value_usd, gas_cost_usd = harvest_is_profitable(
+        vault, staking, get_account()
+    )
+    # Assert
+    assert profitable == False
+    assert value_usd == 0
+
+
+def test_harvest_is_profitable_once_lots_mature():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    deposit(vault, koala_Token, get_account(index=1), Web3.toWei(10, "ether"))
+    vault.harvest({"from": get_account()})
+    chain.sleep(staking.unstakeTime() * 86400 + 1)
+    chain.mine()
+    # Act
+    profitable, value_usd, gas_cost_usd = harvest_is_profitable(
+        vault, staking, get_account()
+    )
+    # Assert
+    assert profitable == True
+    assert value_usd > gas_cost_usd
+    assert next_action(vault, staking, get_account()) == "harvest"
+
+
+def test_payable_withdrawals_are_settled_when_harvest_isnt_profitable():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    deposit(vault, koala_Token, account, Web3.toWei(10, "ether"))
+    vault.harvest({"from": get_account()})
+    vault.claimShares(account, {"from": account})
+    vault.requestWithdraw(vault.balanceOf(account), {"from": account})
+    chain.sleep(staking.unstakeTime() * 86400 + 1)
+    chain.mine()
+    # Act
+    action = next_action(vault, staking, get_account())
+    # Assert
+    assert withdrawals_are_payable(vault) == True
+    assert harvest_is_profitable(vault, staking, get_account())[0] == False
+    assert action == "settleWithdrawals"
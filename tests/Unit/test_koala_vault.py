@@ -0,0 +1,271 @@
+from brownie import network, exceptions, chain
+from scripts.helpful_scripts import (
+    LOCAL_BLOCKCHAIN_ENVIRONMENTS,
+    get_account,
+)
+from scripts.deploy import (
+    deploy_KoalaToken_and_Staking,
+    deploy_KoalaVault,
+)
+import pytest
+from web3 import Web3
+
+KLA_RATE = 6
+VIRTUAL_SHARES = 10**3
+UNSTAKE_TIME = 30 * 86400
+
+
+def wait_until_lots_mature():
+    chain.sleep(UNSTAKE_TIME + 1)
+    chain.mine()
+
+
+def deposit(vault, koala_Token, account, amount):
+    koala_Token.transfer(account, amount, {"from": get_account(index=0)})
+    koala_Token.approve(vault, amount, {"from": account})
+    vault.deposit(amount, {"from": account})
+
+
+def shares_of(vault, account):
+    vault.claimShares(account, {"from": account})
+    return vault.balanceOf(account)
+
+
+def redeemable(vault, account):
+    return vault.convertToAssets(shares_of(vault, account))
+
+
+def request_withdraw_all(vault, account):
+    vault.requestWithdraw(shares_of(vault, account), {"from": account})
+
+
+def test_deposit_is_queued_until_harvest_mints_its_shares():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, account, amount)
+    assert shares_of(vault, account) == 0
+    assert vault.pendingDeposits() == amount
+    assert vault.totalAssets() == 0
+    # Act
+    vault.harvest({"from": get_account()})
+    # Assert
+    staked_value = amount + KLA_RATE * amount
+    assert shares_of(vault, account) == staked_value * VIRTUAL_SHARES
+    assert vault.totalAssets() == staked_value
+    assert vault.pendingDeposits() == 0
+
+
+def test_cant_deposit_less_than_a_share():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    attacker = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    deposit(vault, koala_Token, attacker, 1)
+    vault.harvest({"from": get_account()})
+    donation = Web3.toWei(10, "ether")
+    koala_Token.transfer(vault, donation, {"from": get_account(index=0)})
+    koala_Token.transfer(get_account(index=2), 1, {"from": get_account(index=0)})
+    koala_Token.approve(vault, 1, {"from": get_account(index=2)})
+    # Act & Assert
+    with pytest.raises(exceptions.VirtualMachineError):
+        vault.deposit(1, {"from": get_account(index=2)})
+
+
+def test_only_keeper_can_harvest():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    # Act & Assert
+    with pytest.raises(exceptions.VirtualMachineError):
+        vault.harvest({"from": account})
+    with pytest.raises(exceptions.VirtualMachineError):
+        vault.settleWithdrawals({"from": account})
+
+
+def test_harvest_stakes_every_deposit_at_once():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, get_account(index=1), amount)
+    deposit(vault, koala_Token, get_account(index=2), amount)
+    # Act
+    vault.harvest({"from": get_account()})
+    # Assert
+    assert vault.stakedPrincipal() == amount * 2
+    assert vault.idleAssets() == 0
+    assert vault.pendingDeposits() == 0
+    assert staking.tokenAmountToStakingTime(vault, amount * 2) == chain[-1].timestamp
+
+
+def test_harvest_compounds_matured_rewards():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, get_account(index=1), amount)
+    vault.harvest({"from": get_account()})
+    wait_until_lots_mature()
+    # Act
+    vault.harvest({"from": get_account()})
+    # Assert
+    compounded = amount + KLA_RATE * amount
+    assert vault.stakedPrincipal() == compounded
+    assert vault.lots(0)[0] == compounded
+    assert vault.totalAssets() == compounded + KLA_RATE * compounded
+
+
+def test_harvest_restakes_duplicate_amount_one_wei_lower():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, get_account(index=1), amount)
+    vault.harvest({"from": get_account()})
+    deposit(vault, koala_Token, get_account(index=2), amount)
+    # Act
+    vault.harvest({"from": get_account()})
+    # Assert
+    assert vault.lots(1)[0] == amount - 1
+    assert vault.stakedPrincipal() == amount * 2 - 1
+    assert vault.idleAssets() == 1
+
+
+def test_late_depositor_doesnt_take_earlier_rewards():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    alice = get_account(index=1)
+    bob = get_account(index=2)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, alice, amount)
+    vault.harvest({"from": get_account()})
+    wait_until_lots_mature()
+    # Bob enters once Alice's lot has matured, right before it is harvested.
+    deposit(vault, koala_Token, bob, amount)
+    vault.harvest({"from": get_account()})
+    request_withdraw_all(vault, alice)
+    request_withdraw_all(vault, bob)
+    wait_until_lots_mature()
+    vault.harvest({"from": get_account()})
+    # Act
+    vault.withdraw({"from": alice})
+    vault.withdraw({"from": bob})
+    # Assert
+    alice_compounded = (amount + KLA_RATE * amount) * (1 + KLA_RATE)
+    bob_compounded = amount + KLA_RATE * amount
+    assert koala_Token.balanceOf(alice) == pytest.approx(alice_compounded)
+    assert koala_Token.balanceOf(bob) == pytest.approx(bob_compounded)
+
+
+def test_deposit_made_before_a_lot_matures_keeps_its_reward():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    alice = get_account(index=1)
+    bob = get_account(index=2)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    alice_amount = Web3.toWei(10, "ether")
+    bob_amount = Web3.toWei(20, "ether")
+    deposit(vault, koala_Token, alice, alice_amount)
+    vault.harvest({"from": get_account()})
+    chain.sleep(UNSTAKE_TIME // 2)
+    chain.mine()
+    # Act
+    deposit(vault, koala_Token, bob, bob_amount)
+    vault.harvest({"from": get_account()})
+    # Assert
+    alice_staked_value = alice_amount + KLA_RATE * alice_amount
+    bob_staked_value = bob_amount + KLA_RATE * bob_amount
+    assert redeemable(vault, alice) == pytest.approx(alice_staked_value)
+    assert redeemable(vault, bob) == pytest.approx(bob_staked_value)
+    request_withdraw_all(vault, alice)
+    request_withdraw_all(vault, bob)
+    wait_until_lots_mature()
+    vault.harvest({"from": get_account()})
+    vault.withdraw({"from": alice})
+    vault.withdraw({"from": bob})
+    assert koala_Token.balanceOf(alice) == pytest.approx(alice_staked_value)
+    assert koala_Token.balanceOf(bob) == pytest.approx(bob_staked_value)
+
+
+def test_can_withdraw_after_harvest_processed_request():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, account, amount)
+    vault.harvest({"from": get_account()})
+    request_withdraw_all(vault, account)
+    with pytest.raises(exceptions.VirtualMachineError):
+        vault.withdraw({"from": account})
+    wait_until_lots_mature()
+    vault.harvest({"from": get_account()})
+    # Act
+    vault.withdraw({"from": account})
+    # Assert
+    assert koala_Token.balanceOf(account) == pytest.approx(amount + KLA_RATE * amount)
+    assert vault.totalSupply() == 0
+
+
+def test_settle_withdrawals_pays_without_restaking():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, account, amount)
+    vault.harvest({"from": get_account()})
+    request_withdraw_all(vault, account)
+    wait_until_lots_mature()
+    # Act
+    vault.settleWithdrawals({"from": get_account()})
+    vault.withdraw({"from": account})
+    # Assert
+    assert koala_Token.balanceOf(account) == pytest.approx(amount + KLA_RATE * amount)
+    assert vault.stakedPrincipal() == 0
+
+
+def test_harvest_settles_withdrawals_when_staking_refuses_stakes():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    (staking, koala_Token) = deploy_KoalaToken_and_Staking()
+    vault = deploy_KoalaVault(staking)
+    amount = Web3.toWei(10, "ether")
+    deposit(vault, koala_Token, account, amount)
+    vault.harvest({"from": get_account()})
+    request_withdraw_all(vault, account)
+    wait_until_lots_mature()
+    staking.changeTokenApproval(koala_Token, {"from": get_account()})
+    # Act
+    vault.harvest({"from": get_account()})
+    vault.withdraw({"from": account})
+    # Assert
+    assert koala_Token.balanceOf(account) == pytest.approx(amount + KLA_RATE * amount)
+    assert vault.stakedPrincipal() == 0
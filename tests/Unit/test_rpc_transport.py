@@ -0,0 +1,181 @@
+from scripts.rpc_transport import PooledBatchProvider
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import pytest
+
+HEAD = 0x100
+FINAL_RECEIPT = {"blockNumber": "0x1", "status": "0x1"}
+RECENT_RECEIPT = {"blockNumber": hex(HEAD), "status": "0x1"}
+TOKEN = "0x" + "11" * 20
+# Deployed in the head block, so its code isn't there yet at any confirmed block.
+NEW_CONTRACT = "0x" + "22" * 20
+
+
+class StandInRPC(BaseHTTPRequestHandler):
+    """Answers JSON-RPC requests and batches the way a node would and records every
+    payload it receives."""
+
+    payloads = []
+    delay = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.payloads.append(payload)
+        time.sleep(self.delay)
+        if isinstance(payload, list):
+            body = [self.answer(request) for request in payload]
+        else:
+            body = self.answer(payload)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def answer(self, request):
+        if request["method"] == "eth_getTransactionReceipt":
+            result = FINAL_RECEIPT if request["params"] == ["0x1"] else RECENT_RECEIPT
+        elif request["method"] == "eth_call":
+            # Echoes the sender, like a call that reads msg.sender; an account
+            # without code returns no data.
+            result = request["params"][0].get("from") or "0x"
+        elif request["method"] == "eth_getCode":
+            address, block = request["params"]
+            deployed = address != NEW_CONTRACT or block == "latest"
+            result = "0x6080" if deployed else "0x"
+        else:
+            result = {"eth_blockNumber": hex(HEAD)}.get(request["method"])
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rpc_server():
+    StandInRPC.payloads = []
+    StandInRPC.delay = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInRPC)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def make_provider(rpc_server):
+    providers = []
+
+    def make(**kwargs):
+        providers.append(PooledBatchProvider(rpc_server, **kwargs))
+        return providers[-1]
+
+    yield make
+    for provider in providers:
+        provider.close()
+
+
+@pytest.fixture
+def provider(make_provider):
+    return make_provider()
+
+
+def methods(payloads):
+    return [payload["method"] for payload in payloads if isinstance(payload, dict)]
+
+
+def test_finalized_receipts_are_cached(provider):
+    # Act
+    first = provider.make_request("eth_getTransactionReceipt", ["0x1"])
+    second = provider.make_request("eth_getTransactionReceipt", ["0x1"])
+    # Assert
+    assert first["result"] == second["result"] == FINAL_RECEIPT
+    assert methods(StandInRPC.payloads).count("eth_getTransactionReceipt") == 1
+    assert provider.stats()["cache_hits"] == 1
+
+
+def test_unconfirmed_receipts_are_not_cached(provider):
+    # Act
+    provider.make_request("eth_getTransactionReceipt", ["0x2"])
+    provider.make_request("eth_getTransactionReceipt", ["0x2"])
+    # Assert
+    assert methods(StandInRPC.payloads).count("eth_getTransactionReceipt") == 2
+    assert provider.stats()["cache_hits"] == 0
+
+
+def test_mutable_responses_are_not_cached(provider):
+    # Act
+    provider.make_request("eth_blockNumber", [])
+    provider.make_request("eth_blockNumber", [])
+    # Assert
+    assert len(StandInRPC.payloads) == 2
+    assert provider.stats()["cache_hits"] == 0
+
+
+def test_calls_from_different_senders_are_cached_apart(provider):
+    # Arrange
+    call = {"to": TOKEN, "data": "0x313ce567"}
+    # Act
+    alice = provider.make_request("eth_call", [dict(call, **{"from": "0xa"}), "latest"])
+    bob = provider.make_request("eth_call", [dict(call, **{"from": "0xb"}), "latest"])
+    # Assert
+    assert alice["result"] == "0xa"
+    assert bob["result"] == "0xb"
+
+
+def test_sequential_requests_are_sent_right_away(provider):
+    # Act
+    provider.make_request("eth_blockNumber", [])
+    # Assert
+    assert isinstance(StandInRPC.payloads[0], dict)
+
+
+def test_empty_call_results_are_not_cached(provider):
+    # Arrange
+    call = {"to": TOKEN, "data": "0x313ce567"}
+    # Act
+    first = provider.make_request("eth_call", [call, "latest"])
+    second = provider.make_request("eth_call", [call, "latest"])
+    # Assert
+    assert first["result"] == second["result"] == "0x"
+    assert methods(StandInRPC.payloads).count("eth_call") == 2
+    assert provider.stats()["cache_hits"] == 0
+
+
+def test_latest_code_is_cached_once_confirmed(provider):
+    # Act
+    provider.make_request("eth_getCode", [TOKEN, "latest"])
+    code = provider.make_request("eth_getCode", [TOKEN, "latest"])
+    # Assert
+    assert code["result"] == "0x6080"
+    assert provider.stats()["cache_hits"] == 1
+
+
+def test_latest_code_of_new_contract_isnt_cached(provider):
+    # Act
+    provider.make_request("eth_getCode", [NEW_CONTRACT, "latest"])
+    code = provider.make_request("eth_getCode", [NEW_CONTRACT, "latest"])
+    # Assert
+    assert code["result"] == "0x6080"
+    assert methods(StandInRPC.payloads).count("eth_getCode") == 4
+    assert provider.stats()["cache_hits"] == 0
+
+
+def test_requests_waiting_for_a_connection_are_batched(make_provider):
+    # Arrange
+    StandInRPC.delay = 0.1
+    provider = make_provider(pool_size=1)
+    # Act
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        responses = list(
+            executor.map(
+                lambda _: provider.make_request("eth_blockNumber", []), range(10)
+            )
+        )
+    # Assert
+    assert all(response["result"] == hex(HEAD) for response in responses)
+    assert len(StandInRPC.payloads) < len(responses)
+    assert provider.stats()["batched_requests"] == len(responses) - 1
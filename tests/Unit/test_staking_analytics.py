@@ -0,0 +1,111 @@
+from brownie import network
+from scripts.helpful_scripts import (
+    LOCAL_BLOCKCHAIN_ENVIRONMENTS,
+    get_account,
+)
+from scripts.deploy import (
+    deploy_KoalaToken_and_Staking,
+)
+import pytest
+
+# numpy isn't shipped with brownie; skip these tests rather than failing collection.
+pytest.importorskip("numpy")
+from scripts.staking_analytics import (
+    StakingHistory,
+    load_staking_history,
+    outstanding_reward_liability,
+    maturity_schedule,
+    tvl_usd,
+)
+from web3 import Web3
+
+
+def test_unstaked_positions_are_not_open():
+    # Arrange
+    history = StakingHistory.from_events(
+        staked=[
+            ("a", "kla", 10, 100, 1),
+            ("a", "kla", 20, 200, 2),
+            ("a", "kla", 10, 300, 4),
+        ],
+        unstaked=[("a", "kla", 10, 3)],
+        claimed=[],
+    )
+    # Act
+    open_positions = history.open_positions()
+    # Assert
+    assert list(open_positions) == [False, True, True]
+
+
+def test_positions_are_matched_in_chain_order():
+    # Arrange
+    # Staking lets an unstaked amount be unstaked again, then staked again.
+    history = StakingHistory.from_events(
+        staked=[("a", "kla", 10, 100, 1), ("a", "kla", 10, 400, 4)],
+        unstaked=[("a", "kla", 10, 2), ("a", "kla", 10, 3)],
+        claimed=[],
+    )
+    # Act
+    open_positions = history.open_positions()
+    pending, unclaimed = outstanding_reward_liability(history, [6])
+    # Assert
+    assert list(open_positions) == [False, True]
+    assert list(pending) == [60]
+    assert list(unclaimed) == [120]
+
+
+def test_reward_liability_is_exact_to_the_wei():
+    # Arrange
+    amount = 10**18 + 1
+    history = StakingHistory.from_events(
+        staked=[("a", "kla", amount, 100, 1), ("b", "kla", amount * 2, 100, 2)],
+        unstaked=[],
+        claimed=[],
+    )
+    # Act
+    pending, _ = outstanding_reward_liability(history, [6])
+    _, _, rewards = maturity_schedule(history, [6], 30)
+    # Assert
+    assert pending[0] == 6 * amount * 3
+    assert rewards[0] == 6 * amount * 3
+
+
+def test_analytics_over_open_positions():
+    # Arrange
+    history = StakingHistory.from_events(
+        staked=[("a", "kla", 10, 100, 1), ("b", "link", 40, 90000, 2)],
+        unstaked=[("b", "link", 40, 3)],
+        claimed=[("b", "link", 30)],
+    )
+    rates = [1, 6]  # kla, link
+    # Act
+    pending, unclaimed = outstanding_reward_liability(history, rates)
+    starts, counts, rewards = maturity_schedule(history, rates, 30)
+    tvl = tvl_usd(history, [2, 5], [0, 0])
+    # Assert
+    assert list(pending) == [10, 0]
+    assert list(unclaimed) == [0, 210]
+    assert list(starts) == [30 * 86400]
+    assert list(counts) == [1]
+    assert list(rewards) == [10]
+    assert list(tvl) == [20, 0]
+
+
+def test_load_staking_history():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENVIRONMENTS:
+        pytest.skip()
+    account = get_account(index=1)
+    staking, koala_Token = deploy_KoalaToken_and_Staking()
+    amount = Web3.toWei(10, "ether")
+    koala_Token.transfer(account, amount * 3, {"from": get_account(index=0)})
+    koala_Token.approve(staking, amount * 3, {"from": account})
+    staking.stakeToken(koala_Token, amount, {"from": account})
+    staking.stakeToken(koala_Token, amount * 2, {"from": account})
+    # Act
+    history = load_staking_history(staking)
+    pending, unclaimed = outstanding_reward_liability(history, [6])
+    # Assert
+    assert history.tokens == [koala_Token.address]
+    assert pending[0] == 6 * amount * 3
+    assert unclaimed[0] == 0